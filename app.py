@@ -4,22 +4,39 @@ Main web server connecting database, security, and QR modules.
 Routes:
     /               → Reception registration form
     /register       → POST: encrypt data, save to DB, generate QR
-    /admin          → Admin scanning dashboard
-    /scan           → POST: webcam scan trigger (AJAX)
+    /admin          → Admin scanning dashboard (paged, ?before=<id>&status=)
+    /scan           → POST: queue a webcam scan (AJAX), returns job id
+    /scan/result/<id> → GET: poll a queued webcam scan
     /verify/<id>    → GET:  decrypt & display visitor info
     /checkout/<id>  → POST: mark visitor as checked out
     /qr/<filename>  → Serve generated QR images
 """
 
+import hashlib
+import io
+import logging
 import os
 import re
 import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from flask import (
-    Flask, render_template, request, redirect,
-    url_for, flash, jsonify, send_from_directory, session,
+    Flask, Response, abort, make_response, render_template, stream_template,
+    request, redirect, url_for, flash, get_flashed_messages, jsonify,
+    send_file, send_from_directory, session,
 )
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.security import check_password_hash, generate_password_hash
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from database import (
     init_db,
     add_visitor,
@@ -27,21 +44,39 @@ from database import (
     get_all_visitors,
     migrate_legacy_encrypted_fields,
     update_status,
-    set_verified_by,
+    verify_and_fetch,
     sync_default_admin_credentials,
+    transaction,
     force_reset_user_password,
     get_user,
     update_user_password,
 )
-from security import encrypt_data, decrypt_data
-from qr_handler import generate_qr, scan_qr_from_webcam, QR_DIR
+from security import encrypt_many, decrypt_data_cached, decrypt_data_batch
+from qr_handler import (
+    generate_qr, render_qr, get_cached_qr, scan_qr_from_webcam, QR_DIR, QR_SAVE_TO_DISK,
+)
 
 # ── App Setup ──────────────────────────────────────────────────
+# Module loggers (database, ...) report at INFO; set LOG_LEVEL=DEBUG to
+# also see per-row CRUD messages.
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="[%(levelname)s] %(name)s: %(message)s",
+)
 app = Flask(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FLASK_SECRET_FILE = os.path.join(BASE_DIR, ".flask_secret.key")
 
 
+def _read_flask_secret_file() -> str:
+    """Return the stored session key, or "" when the file is missing/empty."""
+    try:
+        with open(FLASK_SECRET_FILE, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
 def _load_flask_secret_key() -> str:
     """
     Load Flask session key from environment or local file.
@@ -51,19 +86,91 @@ def _load_flask_secret_key() -> str:
     if env_key:
         return env_key
 
-    if os.path.exists(FLASK_SECRET_FILE):
-        with open(FLASK_SECRET_FILE, "r", encoding="utf-8") as f:
-            stored_key = f.read().strip()
-        if stored_key:
-            return stored_key
+    stored_key = _read_flask_secret_file()
+    if stored_key:
+        return stored_key
 
+    # Write the key to a private temp file, then hard-link it into place:
+    # the link is atomic, so no worker ever sees a partially written file,
+    # and an existing key file is never overwritten.
     new_key = secrets.token_hex(32)
-    with open(FLASK_SECRET_FILE, "w", encoding="utf-8") as f:
-        f.write(new_key)
+    fd, tmp_path = tempfile.mkstemp(dir=BASE_DIR, prefix=".flask_secret.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(new_key)
+        try:
+            os.link(tmp_path, FLASK_SECRET_FILE)
+        except FileExistsError:
+            # Another worker won the race; share its key so sessions stay
+            # valid across workers.
+            stored_key = _read_flask_secret_file()
+            if not stored_key:
+                raise RuntimeError(
+                    f"{FLASK_SECRET_FILE} exists but is empty; delete it or set FLASK_SECRET_KEY."
+                )
+            return stored_key
+    finally:
+        os.unlink(tmp_path)
     return new_key
 
 
-app.secret_key = _load_flask_secret_key()
+# Resolved once per process; the file is never re-read after startup.
+FLASK_SECRET_KEY = _load_flask_secret_key()
+app.secret_key = FLASK_SECRET_KEY
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson; jsonify() output is unchanged."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        # Hand datetimes and dataclasses back to Flask's default() so they
+        # keep their HTTP-date / asdict() encoding rather than orjson's.
+        option = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+QR_FILENAME_RE = re.compile(r"visitor_(\d+)\.png")
+REGISTER_FIELDS = ("name", "phone", "purpose")
+
+# Rendered HTML for pages that only vary by login state.
+_static_page_cache: dict = {}  # (template, logged_in) -> (html, etag)
+
+# Internal nginx location aliasing qr_codes/ (e.g. "/internal_qr").
+# When set (with QR_SAVE_TO_DISK), /qr/ cache misses carry X-Accel-Redirect
+# and nginx sends the file.
+QR_ACCEL_REDIRECT_PREFIX = os.getenv("QR_ACCEL_REDIRECT_PREFIX", "").strip().rstrip("/")
+
+# Webcam scans run off the request thread. A single worker because
+# there is only one camera to share; queued jobs wait their turn.
+SCAN_TIMEOUT_SECONDS = 30
+SCAN_JOB_TTL_SECONDS = 300
+_scan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-scan")
+_scan_jobs: dict = {}  # job_id -> (Future, created_at)
+_scan_jobs_lock = threading.Lock()
+
+# Dashboard pages are cached briefly and dropped on every visitor write
+# made through this process.
+ADMIN_PAGE_SIZE = 100
+ADMIN_PAGE_SIZE_MAX = 500
+ADMIN_VIEW_TTL_SECONDS = 5
+ADMIN_STATUS_FILTERS = ("checked_in", "checked_out")
+# Small LRU: ?before= takes any id, so the page count must stay bounded
+ADMIN_VIEW_CACHE_SIZE = 32
+# (limit, before_id, status) -> (expires_at, visitors)
+_admin_view_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_admin_view_lock = threading.Lock()
 
 
 def _env_or_default(name: str, default: str) -> str:
@@ -85,10 +192,54 @@ BOOTSTRAP_PASSWORD = _env_or_default("BOOTSTRAP_PASSWORD", "admin123")
 
 # Initialise the database on first launch
 init_db()
-sync_default_admin_credentials(
-    DEFAULT_ADMIN_USERNAME,
-    generate_password_hash(DEFAULT_ADMIN_PASSWORD),
-)
+
+
+def _default_admin_needs_sync() -> bool:
+    """
+    True when sync_default_admin_credentials() would write anything.
+    Avoids paying a pbkdf2 hash at every boot once the admin has
+    changed the default password.
+    """
+    user = get_user(DEFAULT_ADMIN_USERNAME)
+    return user is None or bool(user["must_change_password"])
+
+
+_default_admin_seeded = False
+_default_admin_seed_lock = threading.Lock()
+
+
+def _seed_default_admin() -> None:
+    """
+    Create/sync the default admin account once per process.
+    Deferred out of import so workers, CLI commands and tests that never
+    serve a login do not pay for a pbkdf2 hash.
+    """
+    global _default_admin_seeded
+    if _default_admin_seeded:
+        return
+    with _default_admin_seed_lock:
+        if _default_admin_seeded:
+            return
+        if _default_admin_needs_sync():
+            sync_default_admin_credentials(
+                DEFAULT_ADMIN_USERNAME,
+                generate_password_hash(DEFAULT_ADMIN_PASSWORD),
+            )
+        _default_admin_seeded = True
+
+
+@app.before_request
+def _ensure_default_admin():
+    """Seed the default admin before the first request is handled."""
+    _seed_default_admin()
+
+
+@app.cli.command("seed-admin")
+def seed_admin_command():
+    """Create or sync the default admin account (flask seed-admin)."""
+    _seed_default_admin()
+
+
 migration_stats = migrate_legacy_encrypted_fields()
 if migration_stats["rows_failed"] > 0:
     print(
@@ -105,17 +256,41 @@ def _require_admin_redirect():
     return None
 
 
-def _build_scan_response(visitor: dict, verified_by: str | None = None) -> dict:
+def _render_static_page(template_name: str):
+    """
+    Render a page whose output depends only on the login state, reusing
+    the HTML across requests and answering revalidations with 304.
+    Pages with pending flash messages are always rendered fresh.
+    """
+    if app.debug or "_flashes" in session:
+        return render_template(template_name)
+
+    key = (template_name, bool(session.get("admin_logged_in")))
+    cached = _static_page_cache.get(key)
+    if cached is None:
+        html = render_template(template_name)
+        cached = (html, hashlib.sha256(html.encode("utf-8")).hexdigest())
+        _static_page_cache[key] = cached
+
+    html, etag = cached
+    response = make_response(html)
+    response.set_etag(etag)
+    # Revalidate every time: a flash may need a fresh render next visit.
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _build_scan_response(visitor: sqlite3.Row, verified_by: str | None = None) -> dict:
     """Build a uniform JSON payload for scanned/verified visitor responses."""
     return {
         "success":     True,
         "id":          visitor["id"],
         "name":        visitor["name"],
-        "phone":       decrypt_data(visitor["encrypted_phone"]),
-        "purpose":     decrypt_data(visitor["encrypted_purpose"]),
+        "phone":       decrypt_data_cached(visitor["encrypted_phone"]),
+        "purpose":     decrypt_data_cached(visitor["encrypted_purpose"]),
         "timestamp":   visitor["timestamp"],
         "status":      visitor["status"],
-        "verified_by": verified_by or visitor.get("verified_by") or "-",
+        "verified_by": verified_by or visitor["verified_by"] or "-",
     }
 
 
@@ -151,14 +326,14 @@ def login():
         session["admin_logged_in"] = True
         session["username"] = username
 
-        if user.get("must_change_password"):
+        if user["must_change_password"]:
             flash("First login detected. Please change your password.", "error")
             return redirect(url_for("change_password"))
 
         flash(f"Welcome, {username}!", "success")
         return redirect(url_for("admin"))
 
-    return render_template("login.html")
+    return _render_static_page("login.html")
 
 
 @app.route("/logout")
@@ -225,19 +400,19 @@ def change_password():
 @app.route("/")
 def index():
     """Landing page with glassmorphism hero."""
-    return render_template("index.html")
+    return _render_static_page("index.html")
 
 
 @app.route("/reception")
 def reception():
     """Reception registration form (dark theme)."""
-    return render_template("reception.html")
+    return _render_static_page("reception.html")
 
 
 @app.route("/about")
 def about():
     """About page — project overview for university examiners."""
-    return render_template("about.html")
+    return _render_static_page("about.html")
 
 
 @app.route("/register", methods=["POST"])
@@ -246,36 +421,39 @@ def register():
     Handle new visitor registration:
         1. Validate form inputs.
         2. Encrypt phone & purpose with AES-256.
-        3. Store record in SQLite.
-        4. Generate QR pass.
-        5. Redirect to success page.
+        3. Store record in SQLite and generate the QR pass
+           (one transaction: a QR failure rolls the row back).
+        4. Render the success page.
     """
-    name    = request.form.get("name", "").strip()
-    phone   = request.form.get("phone", "").strip()
-    purpose = request.form.get("purpose", "").strip()
+    form = request.form
+    name, phone, purpose = (
+        form.get(field, "").strip() for field in REGISTER_FIELDS
+    )
 
     # Basic validation
     if not all([name, phone, purpose]):
         flash("All fields are required.", "error")
         return redirect(url_for("reception"))
 
-    if not re.fullmatch(r"\d{10}", phone):
+    # isdecimal() matches exactly the characters \d does (isdigit() also accepts "²").
+    if len(phone) != 10 or not phone.isdecimal():
         flash("Phone number must be exactly 10 digits.", "error")
         return redirect(url_for("reception"))
 
     try:
         # Encrypt sensitive fields
-        enc_phone   = encrypt_data(phone)
-        enc_purpose = encrypt_data(purpose)
+        enc_phone, enc_purpose = encrypt_many([phone, purpose])
 
-        # Save to database
-        visitor_id = add_visitor(name, enc_phone, enc_purpose)
-        if visitor_id == -1:
-            flash("Database error. Please try again.", "error")
-            return redirect(url_for("reception"))
+        # Save to database and generate the QR pass as one unit:
+        # if QR generation fails the visitor row is rolled back.
+        with transaction():
+            visitor_id = add_visitor(name, enc_phone, enc_purpose)
+            if visitor_id == -1:
+                flash("Database error. Please try again.", "error")
+                return redirect(url_for("reception"))
 
-        # Generate QR pass
-        generate_qr(visitor_id, enc_phone, enc_purpose)
+            generate_qr(visitor_id, enc_phone, enc_purpose)
+        _invalidate_admin_view_cache()
 
         flash(f"Visitor registered successfully! ID: {visitor_id}", "success")
         return render_template(
@@ -290,76 +468,182 @@ def register():
         return redirect(url_for("reception"))
 
 
+def _invalidate_admin_view_cache() -> None:
+    """Drop cached dashboard pages after any visitor write."""
+    with _admin_view_lock:
+        _admin_view_cache.clear()
+
+
+def _load_admin_page(
+    limit: int,
+    before_id: int | None,
+    status: str | None,
+) -> list[dict]:
+    """
+    Fetch and decrypt one dashboard page, reusing a recent result when
+    the same page was built less than ADMIN_VIEW_TTL_SECONDS ago.
+    """
+    key = (limit, before_id, status)
+    now = time.monotonic()
+    with _admin_view_lock:
+        cached = _admin_view_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    visitors = get_all_visitors(limit=limit, before_id=before_id, status=status)
+    # Decrypt all fields in one pass: phones first, then purposes
+    plaintexts = decrypt_data_batch(
+        [v["encrypted_phone"] for v in visitors]
+        + [v["encrypted_purpose"] for v in visitors]
+    )
+    phones, purposes = plaintexts[:len(visitors)], plaintexts[len(visitors):]
+
+    decrypted_visitors = []
+    for v, phone, purpose in zip(visitors, phones, purposes):
+        if phone is None or purpose is None:
+            phone = purpose = "[decryption error]"
+        decrypted_visitors.append({
+            "id":          v["id"],
+            "name":        v["name"],
+            "phone":       phone,
+            "purpose":     purpose,
+            "timestamp":   v["timestamp"],
+            "status":      v["status"],
+            "verified_by": v["verified_by"] or "-",
+        })
+
+    with _admin_view_lock:
+        # Drop expired pages so decrypted data never outlives its TTL for long
+        for stale in [k for k, (expires_at, _) in _admin_view_cache.items() if expires_at <= now]:
+            del _admin_view_cache[stale]
+        _admin_view_cache[key] = (now + ADMIN_VIEW_TTL_SECONDS, decrypted_visitors)
+        _admin_view_cache.move_to_end(key)
+        while len(_admin_view_cache) > ADMIN_VIEW_CACHE_SIZE:
+            _admin_view_cache.popitem(last=False)
+    return decrypted_visitors
+
+
 @app.route("/admin")
 def admin():
-    """Admin dashboard — shows all visitors and scanning controls."""
+    """
+    Admin dashboard — shows visitors (newest first, one page at a time)
+    and scanning controls. ?before=<id> pages to older visitors and
+    ?status=checked_in|checked_out filters the log.
+    """
     auth_redirect = _require_admin_redirect()
     if auth_redirect:
         return auth_redirect
 
-    visitors = get_all_visitors()
-    # Decrypt fields for display
-    decrypted_visitors = []
-    for v in visitors:
-        try:
-            decrypted_visitors.append({
-                "id":          v["id"],
-                "name":        v["name"],
-                "phone":       decrypt_data(v["encrypted_phone"]),
-                "purpose":     decrypt_data(v["encrypted_purpose"]),
-                "timestamp":   v["timestamp"],
-                "status":      v["status"],
-                "verified_by": v.get("verified_by") or "-",
-            })
-        except Exception:
-            decrypted_visitors.append({
-                "id":          v["id"],
-                "name":        v["name"],
-                "phone":       "[decryption error]",
-                "purpose":     "[decryption error]",
-                "timestamp":   v["timestamp"],
-                "status":      v["status"],
-                "verified_by": v.get("verified_by") or "-",
-            })
-    return render_template("admin.html", visitors=decrypted_visitors)
+    limit = request.args.get("limit", ADMIN_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, ADMIN_PAGE_SIZE_MAX))
+    before_id = request.args.get("before", type=int)
+    status = request.args.get("status")
+    if status not in ADMIN_STATUS_FILTERS:
+        status = None
+
+    visitors = _load_admin_page(limit, before_id, status)
+    older_before_id = visitors[-1]["id"] if len(visitors) == limit else None
+
+    # Streamed responses send the session cookie before the body renders,
+    # so pop flashed messages now; base.html then reads the cached copy.
+    get_flashed_messages(with_categories=True)
+    return stream_template(
+        "admin.html",
+        visitors=visitors,
+        older_before_id=older_before_id,
+        is_first_page=before_id is None,
+        status_filter=status,
+        limit=limit,
+    )
 
 
-@app.route("/scan", methods=["POST"])
-def scan():
+def _run_scan_job(admin_user: str) -> tuple[dict, int]:
     """
-    Trigger the webcam scanner. Returns JSON with decrypted visitor
-    data or an error message. Called via AJAX from the admin page.
+    Run the webcam scanner and resolve the visitor (background thread).
+    Returns the JSON payload and HTTP status for /scan/result/<job_id>.
     """
-    if not session.get("admin_logged_in"):
-        return jsonify({"success": False, "message": "Authentication required. Please log in."}), 401
-
     try:
-        result = scan_qr_from_webcam(timeout_seconds=30)
+        result = scan_qr_from_webcam(timeout_seconds=SCAN_TIMEOUT_SECONDS)
         if result is None:
-            return jsonify({"success": False, "message": "No QR code detected. Try again."})
+            return {"success": False, "message": "No QR code detected. Try again."}, 200
 
         visitor_id = result.get("id") if isinstance(result, dict) else None
         if visitor_id is None:
-            return jsonify({"success": False, "message": "Invalid QR payload: missing visitor id."})
+            return {"success": False, "message": "Invalid QR payload: missing visitor id."}, 200
 
         try:
             visitor_id = int(visitor_id)
         except (TypeError, ValueError):
-            return jsonify({"success": False, "message": "Invalid QR payload: visitor id is not a number."})
-
-        visitor = get_visitor(visitor_id)
-        if not visitor:
-            return jsonify({"success": False, "message": f"Visitor ID {visitor_id} not found in database."})
+            return {"success": False, "message": "Invalid QR payload: visitor id is not a number."}, 200
 
         # ── Audit Trail: record which admin scanned this pass ──
-        admin_user = session.get("username", "unknown")
-        set_verified_by(visitor_id, admin_user)
+        visitor = verify_and_fetch(visitor_id, admin_user)
+        if not visitor:
+            return {"success": False, "message": f"Visitor ID {visitor_id} not found in database."}, 200
+        _invalidate_admin_view_cache()
 
-        return jsonify(_build_scan_response(visitor, verified_by=admin_user))
+        return _build_scan_response(visitor, verified_by=admin_user), 200
     except RuntimeError as e:
-        return jsonify({"success": False, "message": str(e)}), 503
+        return {"success": False, "message": str(e)}, 503
     except Exception as e:
-        return jsonify({"success": False, "message": str(e)})
+        return {"success": False, "message": str(e)}, 200
+
+
+def _prune_scan_jobs() -> None:
+    """Forget finished scan jobs whose result was never collected."""
+    cutoff = time.monotonic() - SCAN_JOB_TTL_SECONDS
+    with _scan_jobs_lock:
+        stale = [
+            job_id for job_id, (future, created) in _scan_jobs.items()
+            if future.done() and created < cutoff
+        ]
+        for job_id in stale:
+            del _scan_jobs[job_id]
+
+
+@app.route("/scan", methods=["POST"])
+def scan():
+    """
+    Queue a webcam scan and return its job id immediately.
+    The admin page polls /scan/result/<job_id> for the outcome, so the
+    worker is not held for the whole scan timeout.
+    """
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Authentication required. Please log in."}), 401
+
+    _prune_scan_jobs()
+    admin_user = session.get("username", "unknown")
+    with _scan_jobs_lock:
+        # One camera: while a scan is queued or running, hand back its id
+        # instead of stacking another camera session behind it.
+        for job_id, (future, _) in _scan_jobs.items():
+            if not future.done():
+                break
+        else:
+            job_id = secrets.token_urlsafe(16)
+            future = _scan_executor.submit(_run_scan_job, admin_user)
+            _scan_jobs[job_id] = (future, time.monotonic())
+
+    return jsonify({"success": True, "pending": True, "job_id": job_id}), 202
+
+
+@app.route("/scan/result/<job_id>")
+def scan_result(job_id):
+    """Return the outcome of a queued webcam scan, or a pending marker."""
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Authentication required. Please log in."}), 401
+
+    with _scan_jobs_lock:
+        entry = _scan_jobs.get(job_id)
+        if entry is None:
+            return jsonify({"success": False, "message": "Unknown or expired scan job."}), 404
+        future, _ = entry
+        if not future.done():
+            return jsonify({"success": False, "pending": True, "job_id": job_id}), 202
+        del _scan_jobs[job_id]
+
+    payload, status = future.result()
+    return jsonify(payload), status
 
 
 @app.route("/api/verify-scan", methods=["POST"])
@@ -381,12 +665,11 @@ def verify_scan_api():
     except (TypeError, ValueError):
         return jsonify({"success": False, "message": "visitor_id must be a number."}), 400
 
-    visitor = get_visitor(visitor_id)
+    admin_user = session.get("username", "unknown")
+    visitor = verify_and_fetch(visitor_id, admin_user)
     if not visitor:
         return jsonify({"success": False, "message": f"Visitor ID {visitor_id} not found."}), 404
-
-    admin_user = session.get("username", "unknown")
-    set_verified_by(visitor_id, admin_user)
+    _invalidate_admin_view_cache()
 
     try:
         return jsonify(_build_scan_response(visitor, verified_by=admin_user))
@@ -410,8 +693,8 @@ def verify(visitor_id):
         decrypted = {
             "id":        visitor["id"],
             "name":      visitor["name"],
-            "phone":     decrypt_data(visitor["encrypted_phone"]),
-            "purpose":   decrypt_data(visitor["encrypted_purpose"]),
+            "phone":     decrypt_data_cached(visitor["encrypted_phone"]),
+            "purpose":   decrypt_data_cached(visitor["encrypted_purpose"]),
             "timestamp": visitor["timestamp"],
             "status":    visitor["status"],
         }
@@ -430,6 +713,7 @@ def checkout(visitor_id):
         return auth_redirect
 
     if update_status(visitor_id, "checked_out"):
+        _invalidate_admin_view_cache()
         flash(f"Visitor {visitor_id} checked out.", "success")
     else:
         flash("Could not update status.", "error")
@@ -438,10 +722,35 @@ def checkout(visitor_id):
 
 @app.route("/qr/<filename>")
 def serve_qr(filename):
-    """Serve QR code images from the qr_codes/ directory."""
-    return send_from_directory(QR_DIR, filename)
+    """
+    Serve QR code images from memory. On a cache miss a saved copy in
+    qr_codes/ is used when QR_SAVE_TO_DISK is on (handed to nginx when
+    QR_ACCEL_REDIRECT_PREFIX is set); otherwise the pass is re-rendered
+    from the database without touching the cache or the disk.
+    """
+    match = QR_FILENAME_RE.fullmatch(filename)
+    if not match:
+        abort(404)
+    visitor_id = int(match.group(1))
+    png_bytes = get_cached_qr(visitor_id)
+    if png_bytes is None:
+        if QR_SAVE_TO_DISK and (QR_DIR / filename).is_file():
+            if QR_ACCEL_REDIRECT_PREFIX:
+                return Response(
+                    mimetype="image/png",
+                    headers={"X-Accel-Redirect": f"{QR_ACCEL_REDIRECT_PREFIX}/{filename}"},
+                )
+            return send_from_directory(QR_DIR, filename)
+        visitor = get_visitor(visitor_id)
+        if visitor is None:
+            abort(404)
+        png_bytes = render_qr(
+            visitor_id, visitor["encrypted_phone"], visitor["encrypted_purpose"]
+        )
+    return send_file(io.BytesIO(png_bytes), mimetype="image/png")
 
 
 # ── Run ────────────────────────────────────────────────────────
 if __name__ == "__main__":
+    _seed_default_admin()
     app.run(debug=True, host="127.0.0.1", port=5000)
@@ -3,33 +3,265 @@ database.py - LumenPass Visitor Management System
 Initializes and manages SQLite tables for visitor records and admin users.
 """
 
+import atexit
+import logging
 import os
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "DB_PATH",
+    "get_connection",
+    "close_connections",
+    "checkpoint",
+    "transaction",
+    "init_db",
+    "add_visitor",
+    "get_visitor",
+    "get_all_visitors",
+    "migrate_legacy_encrypted_fields",
+    "update_status",
+    "set_verified_by",
+    "verify_and_fetch",
+    "get_user",
+    "ensure_default_admin",
+    "sync_default_admin_credentials",
+    "force_reset_user_password",
+    "update_user_password",
+]
 
 # Configuration
 DB_NAME = "visitors.db"
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.getenv("VISITOR_DB_PATH", os.path.join(BASE_DIR, DB_NAME))
-if not os.path.isabs(DB_PATH):
-    DB_PATH = os.path.join(BASE_DIR, DB_PATH)
-DB_DIR = os.path.dirname(DB_PATH)
-if DB_DIR:
-    os.makedirs(DB_DIR, exist_ok=True)
-
-
-def get_connection():
-    """Return a new SQLite connection with WAL mode for better concurrency."""
-    conn = sqlite3.connect(DB_PATH)
+_HERE = Path(__file__).resolve().parent
+# Relative VISITOR_DB_PATH values resolve against this directory
+DB_PATH = _HERE / os.getenv("VISITOR_DB_PATH", DB_NAME)
+try:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+except OSError:
+    pass
+
+# One long-lived connection per thread (and per process after a fork),
+# so helpers skip the connect + pragma cost and keep a warm statement cache.
+_local = threading.local()
+
+# Applied to every new connection. The busy timeout comes from
+# sqlite3.connect()'s default timeout=5.0, so it is not repeated here.
+CONNECTION_PRAGMAS = (
+    "PRAGMA auto_vacuum=INCREMENTAL",  # only takes effect on a new DB file
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",       # fsync at checkpoints, not every commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",        # 64 MB page cache
+    "PRAGMA mmap_size=134217728",      # 128 MB memory-mapped reads
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Every connection this process opened, so they can be closed at exit.
+# Stored as (weakref to owning thread, connection) pairs: connections do
+# not support weakrefs, and thread-per-request servers would otherwise
+# keep every finished thread's connection (and its fds) open forever.
+_open_connections: list[tuple[weakref.ref, sqlite3.Connection]] = []
+_open_connections_lock = threading.Lock()
+
+
+def _open_connection() -> sqlite3.Connection:
+    """
+    Open a SQLite connection tuned for a small read-heavy workload.
+
+    journal_mode=WAL persists in the database file; the remaining pragmas
+    are per-connection and must be re-applied on every connect.
+    """
+    # check_same_thread=False only so close_connections() can close it at
+    # exit; during normal operation each connection stays on its thread.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+def get_connection() -> sqlite3.Connection:
+    """
+    Return this thread's SQLite connection, opening it on first use.
+    Callers must not close it; writes should run inside
+    `with _write_scope(conn):` so they commit or roll back as a unit.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _open_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        with _open_connections_lock:
+            dead = _prune_dead_connections()
+            _open_connections.append((weakref.ref(threading.current_thread()), conn))
+        for stale in dead:
+            _close_quietly(stale)
+    return conn
+
+
+def _prune_dead_connections() -> list[sqlite3.Connection]:
+    """Drop registry entries whose thread has exited; caller holds the lock."""
+    dead = []
+    live = []
+    for thread_ref, conn in _open_connections:
+        thread = thread_ref()
+        if thread is None or not thread.is_alive():
+            dead.append(conn)
+        else:
+            live.append((thread_ref, conn))
+    _open_connections[:] = live
+    return dead
+
+
+def _close_quietly(conn: sqlite3.Connection) -> None:
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def close_connections() -> None:
+    """
+    Close every connection opened by this process. Registered with atexit
+    so the last close can checkpoint the WAL and remove -wal/-shm files.
+    """
+    with _open_connections_lock:
+        conns = [conn for _, conn in _open_connections]
+        _open_connections.clear()
+    for conn in conns:
+        try:
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+atexit.register(close_connections)
+
+
+def _reset_after_fork() -> None:
+    # Connections inherited from the parent belong to the parent process,
+    # and the lock may have been held by a thread that no longer exists.
+    global _open_connections_lock
+    _open_connections_lock = threading.Lock()
+    _open_connections.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def transaction():
+    """
+    Run several helpers as one BEGIN IMMEDIATE ... COMMIT unit.
+    Helpers called inside skip their own commit; any exception rolls
+    the whole unit back.
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    _note_write()
+    _local.in_transaction = True
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _local.in_transaction = False
+
+
+def _write_scope(conn: sqlite3.Connection):
+    """Commit/rollback scope for one helper, deferring to an open transaction()."""
+    if getattr(_local, "in_transaction", False):
+        return nullcontext()
+    _note_write()
+    return conn
+
+
+# ── WAL checkpointing ─────────────────────────────────────────
+# wal_autocheckpoint (above) only runs PASSIVE checkpoints on commit and
+# never shrinks the -wal file. Once writes have been quiet for a while a
+# background thread reclaims free pages and truncates the WAL so both
+# files stay small between sessions.
+CHECKPOINT_IDLE_SECONDS = 60
+
+_last_write = 0.0          # time.monotonic() of the latest write scope
+_last_checkpoint = 0.0
+_checkpointer_pid = None   # pid whose checkpointer thread is running
+
+
+def checkpoint() -> tuple[int, int, int]:
+    """
+    Checkpoint the WAL into the main database and truncate it.
+
+    Returns SQLite's (busy, wal_frames, checkpointed_frames) row.
+    """
+    busy, log_frames, done = get_connection().execute(
+        "PRAGMA wal_checkpoint(TRUNCATE)"
+    ).fetchone()
+    return busy, log_frames, done
+
+
+def _checkpoint_when_idle() -> None:
+    global _last_checkpoint
+    while True:
+        time.sleep(CHECKPOINT_IDLE_SECONDS)
+        if _last_write <= _last_checkpoint:
+            continue
+        if time.monotonic() - _last_write < CHECKPOINT_IDLE_SECONDS:
+            continue
+        try:
+            # Return free pages to the filesystem (auto_vacuum=INCREMENTAL
+            # above; a no-op on files created without it), then checkpoint
+            # so the truncated pages land in the main file too. execute()
+            # steps the pragma once, freeing a single page; executescript()
+            # runs it to completion.
+            get_connection().executescript("PRAGMA incremental_vacuum")
+            busy, _, _ = checkpoint()
+        except sqlite3.Error as e:
+            logger.warning("wal checkpoint failed: %s", e)
+            continue
+        if not busy:
+            _last_checkpoint = time.monotonic()
+
+
+def _note_write() -> None:
+    """Record a write and start this process's checkpointer on first use."""
+    global _last_write, _checkpointer_pid
+    _last_write = time.monotonic()
+    if _checkpointer_pid != os.getpid():
+        _checkpointer_pid = os.getpid()
+        threading.Thread(
+            target=_checkpoint_when_idle, name="wal-checkpoint", daemon=True
+        ).start()
+
+
 def init_db():
-    """Create required tables and run safe migrations."""
+    """
+    Create required tables and run safe migrations.
+
+    DDL runs outside an explicit transaction (sqlite3 only auto-begins
+    for DML), so each statement is committed by SQLite itself and no
+    extra commit() round trips are needed.
+    """
     conn = get_connection()
     try:
-        conn.execute(
+        # users audit columns are stored in UTC (CURRENT_TIMESTAMP). The
+        # visitors.timestamp column stays in local time, because it is shown
+        # as-is on passes and existing rows carry no zone to convert from.
+        # Databases created before the switch keep their old localtime
+        # DEFAULTs, so there users.created_at is local while updated_at
+        # writes are UTC; existing users rows are not rewritten.
+        conn.executescript(
             """
             CREATE TABLE IF NOT EXISTS visitors (
                 id                INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,30 +271,23 @@ def init_db():
                 timestamp         TEXT    NOT NULL DEFAULT (datetime('now', 'localtime')),
                 status            TEXT    NOT NULL DEFAULT 'checked_in',
                 verified_by       TEXT    DEFAULT NULL
-            )
-            """
-        )
-        conn.commit()
+            );
 
-        conn.execute(
-            """
             CREATE TABLE IF NOT EXISTS users (
                 id                   INTEGER PRIMARY KEY AUTOINCREMENT,
                 username             TEXT    NOT NULL UNIQUE,
                 password_hash        TEXT    NOT NULL,
                 must_change_password INTEGER NOT NULL DEFAULT 1,
-                created_at           TEXT    NOT NULL DEFAULT (datetime('now', 'localtime')),
-                updated_at           TEXT    NOT NULL DEFAULT (datetime('now', 'localtime'))
-            )
+                created_at           TEXT    NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                updated_at           TEXT    NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
             """
         )
-        conn.commit()
 
         # Migration for older visitors table
         try:
             conn.execute("ALTER TABLE visitors ADD COLUMN verified_by TEXT DEFAULT NULL")
-            conn.commit()
-            print("[OK] Migrated: added verified_by column")
+            logger.info("migrated: added verified_by column")
         except sqlite3.OperationalError:
             pass
 
@@ -71,178 +296,196 @@ def init_db():
             conn.execute(
                 "ALTER TABLE users ADD COLUMN must_change_password INTEGER NOT NULL DEFAULT 1"
             )
-            conn.commit()
-            print("[OK] Migrated: added must_change_password column")
+            logger.info("migrated: added must_change_password column")
         except sqlite3.OperationalError:
             pass
 
-        print(f"[OK] Database initialised: {DB_PATH}")
+        # Secondary indexes for status / audit-trail filtering
+        # (after the migrations so older tables have verified_by)
+        conn.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS idx_visitors_status ON visitors(status);
+            CREATE INDEX IF NOT EXISTS idx_visitors_verified_by ON visitors(verified_by);
+            """
+        )
+
+        logger.info("database initialised: %s", DB_PATH)
     except sqlite3.Error as e:
-        print(f"[ERROR] Database error: {e}")
-    finally:
-        conn.close()
+        conn.rollback()
+        logger.error("database error: %s", e)
 
 
 def add_visitor(name: str, encrypted_phone: str, encrypted_purpose: str) -> int:
     """Insert a new visitor record and return generated row id."""
     conn = get_connection()
     try:
-        cursor = conn.execute(
-            "INSERT INTO visitors (name, encrypted_phone, encrypted_purpose) VALUES (?, ?, ?)",
-            (name, encrypted_phone, encrypted_purpose),
-        )
-        conn.commit()
-        visitor_id = cursor.lastrowid
-        print(f"[OK] Visitor added -> ID {visitor_id}")
+        with _write_scope(conn):
+            visitor_id = conn.execute(
+                "INSERT INTO visitors (name, encrypted_phone, encrypted_purpose) VALUES (?, ?, ?) RETURNING id",
+                (name, encrypted_phone, encrypted_purpose),
+            ).fetchone()[0]
+        logger.debug("visitor added id=%s", visitor_id)
         return visitor_id
     except sqlite3.Error as e:
-        print(f"[ERROR] Insert error: {e}")
+        logger.error("visitor insert failed: %s", e)
         return -1
-    finally:
-        conn.close()
 
 
-def get_visitor(visitor_id: int) -> dict | None:
-    """Fetch one visitor by id."""
-    conn = get_connection()
-    try:
-        row = conn.execute(
-            "SELECT * FROM visitors WHERE id = ?",
-            (visitor_id,),
-        ).fetchone()
-        return dict(row) if row else None
-    finally:
-        conn.close()
+def get_visitor(visitor_id: int) -> sqlite3.Row | None:
+    """Fetch one visitor by id (sqlite3.Row supports row["field"] access)."""
+    return get_connection().execute(
+        "SELECT * FROM visitors WHERE id = ?",
+        (visitor_id,),
+    ).fetchone()
 
 
-def get_all_visitors() -> list[dict]:
-    """Return all visitors (newest first)."""
-    conn = get_connection()
-    try:
-        rows = conn.execute("SELECT * FROM visitors ORDER BY id DESC").fetchall()
-        return [dict(r) for r in rows]
-    finally:
-        conn.close()
+def get_all_visitors(
+    limit: int = 100,
+    before_id: int | None = None,
+    status: str | None = None,
+) -> list[sqlite3.Row]:
+    """
+    Return one page of visitors (newest first), optionally by status.
+
+    Keyset pagination: pass the smallest id of the previous page as
+    before_id to fetch the next (older) page. Walks the rowid B-tree
+    (or idx_visitors_status when filtering), so cost is O(limit)
+    regardless of table size.
+    """
+    clauses = []
+    params: list = []
+    if status is not None:
+        clauses.append("status = ?")
+        params.append(status)
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    params.append(limit)
+
+    return get_connection().execute(
+        f"SELECT * FROM visitors {where}ORDER BY id DESC LIMIT ?",
+        params,
+    ).fetchall()
 
 
 def migrate_legacy_encrypted_fields() -> dict:
     """
-    Re-encrypt legacy AES-CBC visitor fields into current AES-GCM format.
+    Re-encrypt legacy AES-CBC visitor fields into the current AEAD format.
+
+    Runs as one UPDATE with the re-encryption registered as SQLite UDFs,
+    so the table is walked once inside a single transaction. A field that
+    fails to decrypt is left untouched and its row counted as failed; the
+    other field of that row is still migrated.
 
     Returns:
         Migration stats with total rows, migrated rows/fields, and failed rows.
     """
-    from security import decrypt_data, encrypt_data, is_gcm_payload
+    from security import decrypt_data, encrypt_data, is_aead_payload
 
-    stats = {
-        "total_rows": 0,
-        "rows_migrated": 0,
-        "fields_migrated": 0,
-        "rows_failed": 0,
-    }
+    migrated_ids: set[int] = set()
+    failed_ids: set[int] = set()
+    fields_migrated = 0
 
-    conn = get_connection()
-    try:
-        rows = conn.execute(
-            "SELECT id, encrypted_phone, encrypted_purpose FROM visitors"
-        ).fetchall()
-        stats["total_rows"] = len(rows)
-
-        for row in rows:
-            visitor_id = row["id"]
-            phone_cipher = row["encrypted_phone"]
-            purpose_cipher = row["encrypted_purpose"]
-
-            try:
-                new_phone = None
-                new_purpose = None
-
-                if not is_gcm_payload(phone_cipher):
-                    new_phone = encrypt_data(decrypt_data(phone_cipher))
-
-                if not is_gcm_payload(purpose_cipher):
-                    new_purpose = encrypt_data(decrypt_data(purpose_cipher))
-            except Exception:
-                stats["rows_failed"] += 1
-                continue
-
-            if new_phone and new_purpose:
-                conn.execute(
-                    """
-                    UPDATE visitors
-                       SET encrypted_phone = ?, encrypted_purpose = ?
-                     WHERE id = ?
-                    """,
-                    (new_phone, new_purpose, visitor_id),
-                )
-                stats["rows_migrated"] += 1
-                stats["fields_migrated"] += 2
-            elif new_phone:
-                conn.execute(
-                    "UPDATE visitors SET encrypted_phone = ? WHERE id = ?",
-                    (new_phone, visitor_id),
-                )
-                stats["rows_migrated"] += 1
-                stats["fields_migrated"] += 1
-            elif new_purpose:
-                conn.execute(
-                    "UPDATE visitors SET encrypted_purpose = ? WHERE id = ?",
-                    (new_purpose, visitor_id),
-                )
-                stats["rows_migrated"] += 1
-                stats["fields_migrated"] += 1
+    def is_legacy(cipher):
+        # Empty legacy fields have nothing to re-encrypt.
+        return bool(cipher) and not is_aead_payload(cipher)
 
-        conn.commit()
+    def reencrypt(visitor_id, cipher):
+        nonlocal fields_migrated
+        if not is_legacy(cipher):
+            return cipher
+        try:
+            new_cipher = encrypt_data(decrypt_data(cipher))
+        except Exception:
+            failed_ids.add(visitor_id)
+            return cipher
+        migrated_ids.add(visitor_id)
+        fields_migrated += 1
+        return new_cipher
 
-        if stats["rows_migrated"] > 0:
-            print(
-                "[OK] Migrated legacy encrypted data "
-                f"(rows={stats['rows_migrated']}, fields={stats['fields_migrated']})"
+    conn = get_connection()
+    conn.create_function("is_legacy", 1, is_legacy, deterministic=True)
+    conn.create_function("reencrypt", 2, reencrypt)
+    try:
+        with _write_scope(conn):
+            total_rows = conn.execute("SELECT COUNT(*) FROM visitors").fetchone()[0]
+            conn.execute(
+                """
+                UPDATE visitors
+                   SET encrypted_phone = reencrypt(id, encrypted_phone),
+                       encrypted_purpose = reencrypt(id, encrypted_purpose)
+                 WHERE is_legacy(encrypted_phone) OR is_legacy(encrypted_purpose)
+                """
             )
-        return stats
     finally:
-        conn.close()
+        conn.create_function("is_legacy", 1, None)
+        conn.create_function("reencrypt", 2, None)
+
+    stats = {
+        "total_rows": total_rows,
+        "rows_migrated": len(migrated_ids),
+        "fields_migrated": fields_migrated,
+        "rows_failed": len(failed_ids),
+    }
+    if stats["rows_migrated"] > 0:
+        logger.info(
+            "migrated legacy encrypted data rows=%s fields=%s",
+            stats["rows_migrated"],
+            stats["fields_migrated"],
+        )
+    return stats
 
 
 def update_status(visitor_id: int, new_status: str) -> bool:
     """Update visitor status and return True when at least one row changed."""
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         cursor = conn.execute(
             "UPDATE visitors SET status = ? WHERE id = ?",
             (new_status, visitor_id),
         )
-        conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
+    return cursor.rowcount > 0
 
 
 def set_verified_by(visitor_id: int, admin_username: str) -> bool:
     """Record which admin verified/scanned a visitor QR pass."""
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         cursor = conn.execute(
             "UPDATE visitors SET verified_by = ? WHERE id = ?",
             (admin_username, visitor_id),
         )
-        conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
+    return cursor.rowcount > 0
 
 
-def get_user(username: str) -> dict | None:
-    """Fetch one user by username."""
+def verify_and_fetch(visitor_id: int, admin_username: str) -> sqlite3.Row | None:
+    """
+    Record the verifying admin and return the updated visitor row in a
+    single statement (UPDATE ... RETURNING, SQLite 3.35+).
+    Returns None when the visitor does not exist.
+    """
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         row = conn.execute(
-            "SELECT * FROM users WHERE username = ?",
-            (username,),
+            """
+            UPDATE visitors
+               SET verified_by = ?
+             WHERE id = ?
+            RETURNING id, name, encrypted_phone, encrypted_purpose,
+                      timestamp, status, verified_by
+            """,
+            (admin_username, visitor_id),
         ).fetchone()
-        return dict(row) if row else None
-    finally:
-        conn.close()
+    return row
+
+
+def get_user(username: str) -> sqlite3.Row | None:
+    """Fetch one user by username."""
+    return get_connection().execute(
+        "SELECT * FROM users WHERE username = ?",
+        (username,),
+    ).fetchone()
 
 
 def ensure_default_admin(username: str, password_hash: str) -> None:
@@ -251,16 +494,13 @@ def ensure_default_admin(username: str, password_hash: str) -> None:
     Existing user records are never overwritten.
     """
     conn = get_connection()
-    try:
-        cursor = conn.execute(
-            "INSERT OR IGNORE INTO users (username, password_hash, must_change_password) VALUES (?, ?, 1)",
+    with _write_scope(conn):
+        created = conn.execute(
+            "INSERT OR IGNORE INTO users (username, password_hash, must_change_password) VALUES (?, ?, 1) RETURNING id",
             (username, password_hash),
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            print(f"[OK] Default admin user created: {username}")
-    finally:
-        conn.close()
+        ).fetchone()
+    if created is not None:
+        logger.info("default admin user created: %s", username)
 
 
 def sync_default_admin_credentials(username: str, password_hash: str) -> None:
@@ -271,7 +511,7 @@ def sync_default_admin_credentials(username: str, password_hash: str) -> None:
     If user has already changed password (must_change_password=0), do nothing.
     """
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         row = conn.execute(
             "SELECT must_change_password FROM users WHERE username = ?",
             (username,),
@@ -282,8 +522,7 @@ def sync_default_admin_credentials(username: str, password_hash: str) -> None:
                 "INSERT INTO users (username, password_hash, must_change_password) VALUES (?, ?, 1)",
                 (username, password_hash),
             )
-            conn.commit()
-            print(f"[OK] Default admin user created: {username}")
+            logger.info("default admin user created: %s", username)
             return
 
         if int(row["must_change_password"]) == 1:
@@ -291,15 +530,12 @@ def sync_default_admin_credentials(username: str, password_hash: str) -> None:
                 """
                 UPDATE users
                    SET password_hash = ?,
-                       updated_at = datetime('now', 'localtime')
+                       updated_at = CURRENT_TIMESTAMP
                  WHERE username = ?
                 """,
                 (password_hash, username),
             )
-            conn.commit()
-            print(f"[OK] Default admin credentials synced for: {username}")
-    finally:
-        conn.close()
+            logger.info("default admin credentials synced for: %s", username)
 
 
 def force_reset_user_password(username: str, password_hash: str) -> None:
@@ -308,42 +544,36 @@ def force_reset_user_password(username: str, password_hash: str) -> None:
     This is used for emergency/default bootstrap login.
     """
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         conn.execute(
             """
             INSERT INTO users (username, password_hash, must_change_password, updated_at)
-            VALUES (?, ?, 1, datetime('now', 'localtime'))
+            VALUES (?, ?, 1, CURRENT_TIMESTAMP)
             ON CONFLICT(username) DO UPDATE SET
                 password_hash = excluded.password_hash,
                 must_change_password = 1,
-                updated_at = datetime('now', 'localtime')
+                updated_at = CURRENT_TIMESTAMP
             """,
             (username, password_hash),
         )
-        conn.commit()
-        print(f"[OK] Forced password reset for user: {username}")
-    finally:
-        conn.close()
+    logger.info("forced password reset for user: %s", username)
 
 
 def update_user_password(username: str, new_password_hash: str) -> bool:
     """Update a user's password hash and clear must_change_password flag."""
     conn = get_connection()
-    try:
+    with _write_scope(conn):
         cursor = conn.execute(
             """
             UPDATE users
                SET password_hash = ?,
                    must_change_password = 0,
-                   updated_at = datetime('now', 'localtime')
+                   updated_at = CURRENT_TIMESTAMP
              WHERE username = ?
             """,
             (new_password_hash, username),
         )
-        conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
+    return cursor.rowcount > 0
 
 
 if __name__ == "__main__":
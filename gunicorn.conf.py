@@ -0,0 +1,18 @@
+"""
+gunicorn.conf.py — LumenPass production server settings
+Loaded automatically by `gunicorn app:app` when started from the
+project root (Procfile, render.yaml and Dockerfile all do this).
+"""
+
+import os
+
+# Threaded workers hold HTTP keep-alive connections open and serve
+# several requests per process, instead of one socket per request on
+# the default sync worker.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Worker count comes from WEB_CONCURRENCY (read by gunicorn itself) and
+# defaults to 1. Scan jobs and in-memory caches are per process, so
+# raise it only when /scan (desktop webcam mode) is not in use.
@@ -7,9 +7,13 @@ Hardware target: Intel i3 10th Gen / 8 GB RAM — every frame-loop
 operation is kept lightweight to avoid lag.
 """
 
+import io
 import os
 import json
+import threading
 import time
+from collections import OrderedDict, deque
+from pathlib import Path
 
 import qrcode
 from qrcode.constants import ERROR_CORRECT_M
@@ -17,29 +21,88 @@ from PIL import Image
 
 try:
     import cv2
-    from pyzbar.pyzbar import decode as pyzbar_decode
+    # OpenCV's built-in detector: SIMD-optimised C++, works on grayscale
+    _qr_detector = cv2.QRCodeDetector()
     SCAN_IMPORT_ERROR = None
 except Exception as exc:
     cv2 = None
-    pyzbar_decode = None
+    _qr_detector = None
     SCAN_IMPORT_ERROR = exc
 
 # ── Configuration ──────────────────────────────────────────────
-QR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "qr_codes")
-os.makedirs(QR_DIR, exist_ok=True)
+_HERE = Path(__file__).resolve().parent
+QR_DIR = _HERE / "qr_codes"
+
+# Write a PNG copy of each pass to qr_codes/ (off by default; passes are
+# served from memory and re-rendered from the database on a cache miss).
+QR_SAVE_TO_DISK = os.environ.get("QR_SAVE_TO_DISK", "0").strip().lower() in ("1", "true", "yes")
+if QR_SAVE_TO_DISK:
+    try:
+        QR_DIR.mkdir(exist_ok=True)
+    except OSError:
+        pass
+
+SCAN_WINDOW_TITLE = "LumenPass Scanner  |  Press 'q' to quit"
+QUIT_KEY = ord("q")
+
+# Separator for the compact QR payload: "<id>|<enc_phone>|<enc_purpose>"
+QR_FIELD_SEP = "|"
+
+# Shared QR encoder, built once. Moderate error correction is a good
+# balance of size vs. resilience for printed/on-screen passes. Guarded
+# by a lock because gunicorn gthread workers register concurrently.
+_qr = qrcode.QRCode(
+    version=None,                 # Auto-size
+    error_correction=ERROR_CORRECT_M,
+    box_size=10,
+    border=4,
+)
+_qr_lock = threading.Lock()
+
+# zlib level for pass PNGs: 9 = smallest file, lower = faster encode.
+# (Pillow's optimize=True forces 9 and ignores this, so it is not used.)
+QR_PNG_COMPRESS_LEVEL = 9
+
+# Recently generated PNGs kept in memory so /qr/ can skip the disk read.
+QR_CACHE_SIZE = 512
+_qr_cache: "OrderedDict[int, bytes]" = OrderedDict()
+_qr_cache_lock = threading.Lock()
+
+
+def _cache_qr(visitor_id: int, png_bytes: bytes) -> None:
+    with _qr_cache_lock:
+        _qr_cache[visitor_id] = png_bytes
+        _qr_cache.move_to_end(visitor_id)
+        while len(_qr_cache) > QR_CACHE_SIZE:
+            _qr_cache.popitem(last=False)
+
+
+def get_cached_qr(visitor_id: int) -> bytes | None:
+    """Return cached PNG bytes for a visitor pass, or None on a miss."""
+    with _qr_cache_lock:
+        png_bytes = _qr_cache.get(visitor_id)
+        if png_bytes is not None:
+            _qr_cache.move_to_end(visitor_id)
+        return png_bytes
 
 
 # ── QR Code Generation ────────────────────────────────────────
 
 def generate_qr(visitor_id: int,
                 encrypted_phone: str,
-                encrypted_purpose: str) -> str:
+                encrypted_purpose: str) -> bytes:
     """
     Generate a QR code image containing the visitor's encrypted data.
 
-    The QR payload is a compact JSON string:
-        {"id": 42, "p": "<enc_phone>", "r": "<enc_purpose>"}
-    Short keys ('p', 'r') keep the QR small and fast to scan.
+    The QR payload is a pipe-separated string with base64 padding removed:
+        42|<enc_phone>|<enc_purpose>
+    Fewer bytes than JSON means a lower QR version (fewer modules), which
+    is faster to detect. parse_qr_payload() also accepts the older JSON
+    form so passes printed before this change still scan.
+
+    The PNG (see render_qr) is cached for serving. With QR_SAVE_TO_DISK
+    enabled the same bytes are also written to qr_codes/ on a background
+    thread, so the caller never waits on the disk.
 
     Args:
         visitor_id       : Database row ID of the visitor.
@@ -47,38 +110,94 @@ def generate_qr(visitor_id: int,
         encrypted_purpose: Base64 AES-256 cipher of the visit purpose.
 
     Returns:
-        Absolute path to the saved PNG image.
+        PNG image bytes.
     """
-    # Build a minimal JSON payload
-    payload = json.dumps({
-        "id": visitor_id,
-        "p": encrypted_phone,
-        "r": encrypted_purpose,
-    }, separators=(",", ":"))          # No extra whitespace
-
-    # Create QR with moderate error correction (good balance of
-    # size vs. resilience for printed/on-screen passes)
-    qr = qrcode.QRCode(
-        version=None,                 # Auto-size
-        error_correction=ERROR_CORRECT_M,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(payload)
-    qr.make(fit=True)
+    png_bytes = render_qr(visitor_id, encrypted_phone, encrypted_purpose)
+    _cache_qr(visitor_id, png_bytes)
+
+    if QR_SAVE_TO_DISK:
+        filepath = QR_DIR / f"visitor_{visitor_id}.png"
+        # Non-daemon so a pending write still finishes on shutdown
+        threading.Thread(target=_save_qr_file, args=(filepath, png_bytes)).start()
+    return png_bytes
+
+
+def render_qr(visitor_id: int,
+              encrypted_phone: str,
+              encrypted_purpose: str) -> bytes:
+    """
+    Encode a visitor pass to PNG bytes without caching or saving it.
+    Used directly to re-render passes on the read path.
+    """
+    # Build a minimal payload ('|' never occurs in base64)
+    payload = QR_FIELD_SEP.join((
+        str(visitor_id),
+        encrypted_phone.rstrip("="),
+        encrypted_purpose.rstrip("="),
+    ))
+
+    # Reuse the shared encoder; reset version so each pass is auto-sized
+    # again instead of growing from the previous pass's version.
+    with _qr_lock:
+        _qr.clear()
+        _qr.version = None
+        _qr.add_data(payload)
+        _qr.make(fit=True)
+        img: Image.Image = _qr.make_image(fill_color="black", back_color="white")
+
+    # Pure black/white makes qrcode emit a 1-bit ("1" mode) image, so the
+    # PNG is bilevel already; zlib level 9 is what optimize=True would pick.
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=QR_PNG_COMPRESS_LEVEL)
+    return buf.getvalue()
+
+
+def _save_qr_file(filepath: Path, png_bytes: bytes) -> None:
+    try:
+        filepath.write_bytes(png_bytes)
+        print(f"[OK] QR saved -> {filepath}")
+    except OSError as e:
+        print(f"[ERROR] QR save failed ({filepath}): {e}")
+
 
-    img: Image.Image = qr.make_image(fill_color="black", back_color="white")
+def _restore_b64_padding(text: str) -> str:
+    return text + "=" * (-len(text) % 4)
 
-    # Save to qr_codes/ directory
-    filename = f"visitor_{visitor_id}.png"
-    filepath = os.path.join(QR_DIR, filename)
-    img.save(filepath)
-    print(f"[OK] QR saved -> {filepath}")
-    return filepath
+
+def parse_qr_payload(data: str) -> dict | None:
+    """
+    Decode a scanned pass into {"id": int, "p": str, "r": str}.
+
+    Accepts the compact "id|p|r" form and the legacy JSON form.
+    Returns None for anything that is not a LumenPass payload.
+    """
+    if data.startswith("{"):
+        try:
+            result = json.loads(data)
+        except json.JSONDecodeError:
+            return None
+        return result if isinstance(result, dict) else None
+
+    parts = data.split(QR_FIELD_SEP, 2)
+    if len(parts) != 3 or not parts[0].isdecimal():
+        return None
+    return {
+        "id": int(parts[0]),
+        "p": _restore_b64_padding(parts[1]),
+        "r": _restore_b64_padding(parts[2]),
+    }
 
 
 # ── Optimised Webcam Scanner ──────────────────────────────────
 
+def _capture_frames(cap, frames: deque, stop: threading.Event) -> None:
+    """Producer thread: keep only the newest camera frame in `frames`."""
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if ret:
+            frames.append(frame)
+
+
 def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
     """
     Open the default webcam, scan for a QR code, and return the
@@ -87,7 +206,10 @@ def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
 
     Optimisation notes (for i3 / 8 GB systems):
         • Resolution capped at 640×480 to reduce per-frame work.
-        • Only every 3rd frame is decoded (pyzbar is the bottleneck).
+        • Frames are read on a background thread into a 1-slot buffer,
+          so capture overlaps decoding and only the newest frame is used.
+        • Frames are converted to grayscale and decoded with OpenCV's
+          QRCodeDetector, cheap enough to run on every frame.
         • Camera resource is released in a finally block so it never
           leaks, even on exceptions.
 
@@ -95,8 +217,8 @@ def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
         timeout_seconds: Max seconds to keep the camera open.
 
     Returns:
-        Parsed dict from the QR JSON payload, or None on timeout /
-        error / invalid data.
+        Parsed dict from the QR payload (see parse_qr_payload), or None
+        on timeout / error / invalid data.
     """
     if SCAN_IMPORT_ERROR is not None:
         raise RuntimeError(
@@ -114,54 +236,42 @@ def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-    result = None
-    frame_count = 0
+    frames: deque = deque(maxlen=1)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_capture_frames, args=(cap, frames, stop), daemon=True
+    )
+    reader.start()
     start = time.time()
 
     try:
         while time.time() - start < timeout_seconds:
-            ret, frame = cap.read()
-            if not ret:
-                continue
-
-            frame_count += 1
-
-            # Decode only every 3rd frame to save CPU
-            if frame_count % 3 != 0:
-                # Still show the preview so the user can aim
-                cv2.imshow("LumenPass Scanner  |  Press 'q' to quit", frame)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
+            try:
+                frame = frames.pop()
+            except IndexError:
+                # No new frame yet — keep the preview window responsive
+                cv2.waitKey(1)
                 continue
 
-            # Attempt QR detection
-            decoded_objects = pyzbar_decode(frame)
-            for obj in decoded_objects:
-                try:
-                    data = obj.data.decode("utf-8")
-                    result = json.loads(data)
+            # Attempt QR detection on a single-channel copy of the frame
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            data, points, _ = _qr_detector.detectAndDecode(gray)
+            if data:
+                # Not our QR (None) — ignore and keep scanning
+                result = parse_qr_payload(data)
+                if result is not None:
                     print(f"[OK] QR scanned -> Visitor ID {result.get('id')}")
 
-                    # Draw a green rectangle around the detected code
-                    pts = obj.polygon
-                    if pts:
-                        for i in range(len(pts)):
-                            cv2.line(
-                                frame,
-                                (pts[i].x, pts[i].y),
-                                (pts[(i + 1) % len(pts)].x, pts[(i + 1) % len(pts)].y),
-                                (0, 255, 0), 3,
-                            )
-                    cv2.imshow("LumenPass Scanner  |  Press 'q' to quit", frame)
+                    # Draw a green outline around the detected code
+                    if points is not None:
+                        cv2.polylines(frame, [points.astype("int32")], True, (0, 255, 0), 3)
+                    cv2.imshow(SCAN_WINDOW_TITLE, frame)
                     cv2.waitKey(800)  # Brief pause so user sees the detection
                     return result
-                except (json.JSONDecodeError, UnicodeDecodeError):
-                    # Not our QR — ignore and keep scanning
-                    continue
 
             # Show live preview
-            cv2.imshow("LumenPass Scanner  |  Press 'q' to quit", frame)
-            if cv2.waitKey(1) & 0xFF == ord("q"):
+            cv2.imshow(SCAN_WINDOW_TITLE, frame)
+            if cv2.waitKey(1) & 0xFF == QUIT_KEY:
                 break
 
         print("[WARN] Scanner timed out: no QR code detected.")
@@ -169,6 +279,8 @@ def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
 
     finally:
         # ── CRITICAL: always free the camera & windows ──
+        stop.set()
+        reader.join(timeout=1)
         cap.release()
         cv2.destroyAllWindows()
         print("[OK] Camera released.")
@@ -177,12 +289,12 @@ def scan_qr_from_webcam(timeout_seconds: int = 30) -> dict | None:
 # ── Standalone Test ────────────────────────────────────────────
 if __name__ == "__main__":
     # Quick generation test with dummy encrypted strings
-    path = generate_qr(
+    png = generate_qr(
         visitor_id=1,
         encrypted_phone="dGVzdF9waG9uZV9lbmNyeXB0ZWQ=",
         encrypted_purpose="dGVzdF9wdXJwb3NlX2VuY3J5cHRlZA==",
     )
-    print(f"Test QR created at: {path}")
+    print(f"Test QR created ({len(png)} bytes)")
 
     # Uncomment below to test the webcam scanner interactively:
     # data = scan_qr_from_webcam()
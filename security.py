@@ -2,18 +2,33 @@
 security.py - LumenPass AES-256 Encryption Module
 Handles cryptographic operations for the visitor management system.
 
-Default encryption: AES-256-GCM (authenticated encryption).
+Default encryption: AES-256-GCM (authenticated encryption), or
+ChaCha20-Poly1305 on CPUs without AES instructions.
 Legacy support: AES-256-CBC with PKCS7 padding for older payloads.
 Key storage: .secret.key file alongside this script.
 """
 
-import base64
 import binascii
+import functools
+import itertools
+import logging
 import os
+import threading
 
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import unpad
+try:
+    # SIMD (AVX2/NEON) codec with the same API as the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+logger = logging.getLogger(__name__)
 
 KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".secret.key")
 KEY_SIZE = 32  # 256 bits
@@ -22,10 +37,24 @@ KEY_SIZE = 32  # 256 bits
 GCM_MAGIC = b"GCM1"
 GCM_NONCE_SIZE = 12
 GCM_TAG_SIZE = 16
+GCM_HEADER_SIZE = len(GCM_MAGIC) + GCM_NONCE_SIZE + GCM_TAG_SIZE
+
+# ChaCha20-Poly1305 payloads use the same layout and sizes, tagged with
+# their own magic so either host can decrypt the other's data.
+CHACHA_MAGIC = b"CCP1"
+CHACHA_KEY_INFO = b"lumenpass chacha20-poly1305"
 
 # Legacy payload format: base64(iv + ciphertext)
 IV_SIZE = 16  # AES block size
 
+# Size ceilings checked before any decode/encode work: about 16 KiB of raw
+# payload, far more than any visitor field or QR pass can hold.
+MAX_B64_LEN = 4 * ((1 << 14) // 3) + 4
+MAX_PLAIN_BYTES = (MAX_B64_LEN // 4) * 3 - GCM_HEADER_SIZE
+
+# Decrypted plaintexts kept in memory for repeat dashboard renders.
+DECRYPT_CACHE_SIZE = 4096
+
 
 def _harden_key_file_permissions() -> None:
     """Best-effort permission hardening for key file."""
@@ -37,11 +66,17 @@ def _harden_key_file_permissions() -> None:
 
 
 def _read_key_file() -> bytes:
-    with open(KEY_FILE, "rb") as f:
-        key = f.read()
+    # One unbuffered read of at most KEY_SIZE + 1 bytes: enough to detect
+    # an oversized file without sizing a buffer for the whole thing.
+    fd = os.open(KEY_FILE, os.O_RDONLY)
+    try:
+        key = os.read(fd, KEY_SIZE + 1)
+    finally:
+        os.close(fd)
 
     if len(key) != KEY_SIZE:
-        raise ValueError(f"Corrupted key file: expected {KEY_SIZE} bytes, got {len(key)}")
+        got = "more" if len(key) > KEY_SIZE else len(key)
+        raise ValueError(f"Corrupted key file: expected {KEY_SIZE} bytes, got {got}")
 
     _harden_key_file_permissions()
     return key
@@ -57,7 +92,7 @@ def _load_or_create_key() -> bytes:
     if os.path.exists(KEY_FILE):
         return _read_key_file()
 
-    key = get_random_bytes(KEY_SIZE)
+    key = os.urandom(KEY_SIZE)
     try:
         fd = os.open(KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
         with os.fdopen(fd, "wb") as f:
@@ -70,20 +105,91 @@ def _load_or_create_key() -> bytes:
     return key
 
 
-# Load once at import time so every call reuses the same key.
-_KEY = _load_or_create_key()
+# Loaded on first use rather than at import, so importing this module
+# does no file I/O and the key file is only created when data is encrypted.
+@functools.lru_cache(maxsize=1)
+def _key() -> bytes:
+    return _load_or_create_key()
+
+
+@functools.lru_cache(maxsize=1)
+def _aesgcm() -> AESGCM:
+    # OpenSSL-backed AEAD context; the key schedule is expanded once here
+    # instead of on every encrypt/decrypt call.
+    return AESGCM(_key())
+
+
+@functools.lru_cache(maxsize=1)
+def _chacha() -> ChaCha20Poly1305:
+    # Separate subkey so the AES and ChaCha paths never share key material
+    subkey = HKDF(
+        algorithm=hashes.SHA256(), length=KEY_SIZE, salt=None, info=CHACHA_KEY_INFO
+    ).derive(_key())
+    return ChaCha20Poly1305(subkey)
+
+
+def _cpu_has_aes() -> bool:
+    """
+    Return False only when /proc/cpuinfo is readable and lists no AES
+    instructions (x86 "aes" flag, ARMv8 "aes" feature). Other platforms
+    are assumed to have them.
+    """
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.strip() in ("flags", "Features"):
+                    return "aes" in value.split()
+    except OSError:
+        pass
+    return True
+
+
+@functools.lru_cache(maxsize=1)
+def _sealing_aead():
+    """(magic, AEAD) used for new payloads on this host, chosen once."""
+    backend = default_backend().openssl_version_text()
+    if _cpu_has_aes():
+        logger.info("sealing with AES-256-GCM (%s)", backend)
+        return GCM_MAGIC, _aesgcm()
+    logger.warning(
+        "CPU reports no AES instructions; sealing with ChaCha20-Poly1305 (%s). "
+        "Legacy AES-CBC/GCM payloads still decrypt, but several times slower.",
+        backend,
+    )
+    return CHACHA_MAGIC, _chacha()
+
+
+def _aead_for(raw: bytes):
+    """AEAD matching a payload's magic, or None for legacy CBC payloads."""
+    magic = raw[: len(GCM_MAGIC)]
+    if magic == GCM_MAGIC:
+        return _aesgcm()
+    if magic == CHACHA_MAGIC:
+        return _chacha()
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _aes_algorithm() -> algorithms.AES:
+    # Validated AES algorithm object for legacy CBC decrypts, built once so
+    # each call only wraps it with a fresh IV.
+    return algorithms.AES(_key())
 
 
 def _decode_base64_strict(encoded_text: str) -> bytes:
+    if len(encoded_text) > MAX_B64_LEN:
+        raise ValueError("Encrypted payload too large.")
     try:
         return base64.b64decode(encoded_text, validate=True)
     except (binascii.Error, ValueError, TypeError) as exc:
         raise ValueError("Malformed encrypted payload.") from exc
 
 
-def is_gcm_payload(encoded_text: str) -> bool:
+def is_aead_payload(encoded_text: str) -> bool:
     """
-    Return True when payload is in the current AES-GCM format.
+    Return True when payload is in a current format (AES-GCM or
+    ChaCha20-Poly1305) rather than legacy CBC.
     """
     if not isinstance(encoded_text, str) or not encoded_text:
         return False
@@ -91,38 +197,143 @@ def is_gcm_payload(encoded_text: str) -> bool:
         raw = _decode_base64_strict(encoded_text)
     except ValueError:
         return False
-    return raw.startswith(GCM_MAGIC)
+    return raw[: len(GCM_MAGIC)] in (GCM_MAGIC, CHACHA_MAGIC)
+
+
+# ── Nonces ────────────────────────────────────────────────────
+# AEAD nonces only need to be unique per key, so they are built as an
+# 8-byte random prefix + 4-byte big-endian counter (NIST SP 800-38D
+# deterministic construction) instead of a getrandom() call per encrypt.
+# The prefix is re-drawn when the counter runs out and in every forked
+# child, so two processes never continue the same sequence.
+NONCE_PREFIX_SIZE = 8
+NONCE_COUNTER_LIMIT = 1 << (8 * (GCM_NONCE_SIZE - NONCE_PREFIX_SIZE))
+
+_nonce_lock = threading.Lock()
+# (prefix, counter) swapped as one object so readers never mix the two
+_nonce_state = (os.urandom(NONCE_PREFIX_SIZE), itertools.count())
+
+
+def _reseed_nonces() -> None:
+    global _nonce_state
+    _nonce_state = (os.urandom(NONCE_PREFIX_SIZE), itertools.count())
+
+
+def _next_nonce() -> bytes:
+    while True:
+        state = _nonce_state
+        prefix, counter = state
+        n = next(counter)
+        if n < NONCE_COUNTER_LIMIT:
+            return prefix + n.to_bytes(GCM_NONCE_SIZE - NONCE_PREFIX_SIZE, "big")
+        with _nonce_lock:
+            if _nonce_state is state:
+                _reseed_nonces()
+
+
+def _reset_nonces_after_fork() -> None:
+    global _nonce_lock
+    _nonce_lock = threading.Lock()
+    _reseed_nonces()
+
+
+os.register_at_fork(after_in_child=_reset_nonces_after_fork)
+
+
+def _plain_text_bytes(plain_text: str) -> bytes:
+    """Validate plaintext and return its UTF-8 bytes."""
+    if not isinstance(plain_text, str):
+        raise ValueError("plain_text must be a string.")
+    if not plain_text:
+        raise ValueError("Cannot encrypt empty data.")
+    # Character count is a lower bound on UTF-8 length: reject huge input
+    # before encoding it.
+    if len(plain_text) > MAX_PLAIN_BYTES:
+        raise ValueError("plain_text too large.")
+    data = plain_text.encode("utf-8")
+    if len(data) > MAX_PLAIN_BYTES:
+        raise ValueError("plain_text too large.")
+    return data
+
+
+def _seal(nonce: bytes, data: bytes) -> bytearray:
+    """Encrypt data under nonce and return the raw AEAD payload."""
+    magic, aead = _sealing_aead()
+    # The AEAD returns ciphertext || tag; stored layout keeps the tag first.
+    sealed = memoryview(aead.encrypt(nonce, data, None))
+    ct_len = len(sealed) - GCM_TAG_SIZE
+
+    # Assemble magic | nonce | tag | ciphertext in one preallocated buffer
+    payload = bytearray(GCM_HEADER_SIZE + len(sealed))
+    payload[: len(GCM_MAGIC)] = magic
+    payload[len(GCM_MAGIC) : len(GCM_MAGIC) + GCM_NONCE_SIZE] = nonce
+    payload[GCM_HEADER_SIZE - GCM_TAG_SIZE : GCM_HEADER_SIZE] = sealed[ct_len:]
+    payload[GCM_HEADER_SIZE:] = sealed[:ct_len]
+    return payload
+
+
+def encrypt_data_bytes(plain_text: str) -> bytes:
+    """
+    Encrypt plaintext and return the raw payload (no base64).
+
+    Same layout as encrypt_data() before encoding, for binary consumers
+    such as BLOB columns or files.
+
+    Raises:
+        ValueError: If plain_text is empty, too large, or not a string.
+    """
+    return bytes(_seal(_next_nonce(), _plain_text_bytes(plain_text)))
 
 
 def encrypt_data(plain_text: str) -> str:
     """
-    Encrypt plaintext with AES-256-GCM.
+    Encrypt plaintext with AES-256-GCM (ChaCha20-Poly1305 without AES-NI).
 
     Args:
         plain_text: The string to encrypt.
 
     Returns:
-        Base64 payload containing GCM metadata and ciphertext.
+        Base64 payload containing AEAD metadata and ciphertext.
 
     Raises:
-        ValueError: If plain_text is empty or not a string.
+        ValueError: If plain_text is empty, too large, or not a string.
     """
-    if not isinstance(plain_text, str):
-        raise ValueError("plain_text must be a string.")
-    if not plain_text:
-        raise ValueError("Cannot encrypt empty data.")
+    return _encrypt_bytes(_plain_text_bytes(plain_text))
+
 
-    nonce = get_random_bytes(GCM_NONCE_SIZE)
-    cipher = AES.new(_KEY, AES.MODE_GCM, nonce=nonce, mac_len=GCM_TAG_SIZE)
-    ciphertext, tag = cipher.encrypt_and_digest(plain_text.encode("utf-8"))
+def _encrypt_bytes(data: bytes) -> str:
+    """
+    Encrypt already-encoded plaintext and return the base64 payload.
 
-    payload = GCM_MAGIC + nonce + tag + ciphertext
+    Skips the str validation and UTF-8 encode of encrypt_data(); callers
+    must pass non-empty data of at most MAX_PLAIN_BYTES.
+    """
+    payload = _seal(_next_nonce(), data)
     return base64.b64encode(payload).decode("ascii")
 
 
-def _decrypt_gcm_payload(raw: bytes) -> str:
-    min_len = len(GCM_MAGIC) + GCM_NONCE_SIZE + GCM_TAG_SIZE + 1
-    if len(raw) < min_len:
+def encrypt_many(plain_texts: list[str]) -> list[str]:
+    """
+    Encrypt several plaintexts with the shared AEAD context.
+
+    Every input is validated before anything is encrypted, so a bad item
+    fails the whole call up front rather than half-way through.
+
+    Args:
+        plain_texts: Strings to encrypt.
+
+    Returns:
+        Base64 payloads in input order, each with its own nonce.
+
+    Raises:
+        ValueError: If any item is empty, too large, or not a string.
+    """
+    datas = [_plain_text_bytes(plain_text) for plain_text in plain_texts]
+    return [_encrypt_bytes(data) for data in datas]
+
+
+def _decrypt_aead_payload(raw: bytes, aead) -> str:
+    if len(raw) <= GCM_HEADER_SIZE:
         raise ValueError("Malformed encrypted payload.")
 
     offset = len(GCM_MAGIC)
@@ -132,10 +343,9 @@ def _decrypt_gcm_payload(raw: bytes) -> str:
     ciphertext = raw[offset + GCM_TAG_SIZE :]
 
     try:
-        cipher = AES.new(_KEY, AES.MODE_GCM, nonce=nonce, mac_len=GCM_TAG_SIZE)
-        plaintext = cipher.decrypt_and_verify(ciphertext, tag)
+        plaintext = aead.decrypt(nonce, ciphertext + tag, None)
         return plaintext.decode("utf-8")
-    except (ValueError, UnicodeDecodeError) as exc:
+    except (InvalidTag, UnicodeDecodeError) as exc:
         raise ValueError("Invalid or tampered ciphertext.") from exc
 
 
@@ -145,13 +355,23 @@ def _decrypt_legacy_cbc_payload(raw: bytes) -> str:
 
     iv = raw[:IV_SIZE]
     ciphertext = raw[IV_SIZE:]
-    if len(ciphertext) == 0 or len(ciphertext) % AES.block_size != 0:
+    if len(ciphertext) == 0 or len(ciphertext) % IV_SIZE != 0:
         raise ValueError("Malformed legacy ciphertext payload.")
 
     try:
-        cipher = AES.new(_KEY, AES.MODE_CBC, iv)
-        decrypted = unpad(cipher.decrypt(ciphertext), AES.block_size)
-        return decrypted.decode("utf-8")
+        # OpenSSL EVP (AES-NI where available), same backend as AESGCM
+        decryptor = Cipher(_aes_algorithm(), modes.CBC(iv)).decryptor()
+        # Decrypt straight into one buffer (update_into needs a block of slack)
+        padded = bytearray(len(ciphertext) + IV_SIZE - 1)
+        written = decryptor.update_into(ciphertext, padded)
+        decryptor.finalize()
+        # Inline PKCS7 check: last byte n in 1..16, and the last n bytes all equal n
+        pad_len = padded[written - 1]
+        if not 1 <= pad_len <= IV_SIZE or (
+            padded.count(pad_len, written - pad_len, written) != pad_len
+        ):
+            raise ValueError("Invalid padding.")
+        return padded[: written - pad_len].decode("utf-8")
     except (ValueError, UnicodeDecodeError) as exc:
         raise ValueError("Invalid or tampered ciphertext.") from exc
 
@@ -164,29 +384,76 @@ def decrypt_data(encoded_text: str) -> str:
         encoded_text: Base64 encrypted payload string.
 
     Returns:
-        Original plaintext string.
+        Original plaintext string, or "" for a None/empty payload (legacy
+        rows) without touching the cipher.
 
     Raises:
-        ValueError: If payload is empty, malformed, or fails authenticity checks.
+        ValueError: If payload is malformed or fails authenticity checks.
     """
+    if encoded_text is None or encoded_text == "":
+        return ""
     if not isinstance(encoded_text, str):
         raise ValueError("encoded_text must be a string.")
-    if not encoded_text:
-        raise ValueError("Cannot decrypt empty data.")
 
-    raw = _decode_base64_strict(encoded_text)
-    if raw.startswith(GCM_MAGIC):
-        return _decrypt_gcm_payload(raw)
+    return decrypt_data_bytes(_decode_base64_strict(encoded_text))
+
+
+def decrypt_data_bytes(raw: bytes) -> str:
+    """
+    Decrypt a raw payload from encrypt_data_bytes() (or a decoded legacy
+    CBC payload).
+
+    Raises:
+        ValueError: If payload is malformed or fails authenticity checks.
+    """
+    if len(raw) > MAX_PLAIN_BYTES + GCM_HEADER_SIZE:
+        raise ValueError("Encrypted payload too large.")
+    aead = _aead_for(raw)
+    if aead is not None:
+        return _decrypt_aead_payload(raw, aead)
 
-    # Backward compatibility: base64(iv + ciphertext) payloads.
+    # Backward compatibility: iv + ciphertext payloads.
     return _decrypt_legacy_cbc_payload(raw)
 
 
+@functools.lru_cache(maxsize=DECRYPT_CACHE_SIZE)
+def decrypt_data_cached(encoded_text: str) -> str:
+    """
+    Memoised decrypt_data() keyed by the ciphertext string.
+
+    Ciphertexts are immutable once stored (every encrypt uses a fresh
+    nonce), so a cached plaintext can never go stale. Failures are not
+    cached and raise exactly like decrypt_data().
+    """
+    return decrypt_data(encoded_text)
+
+
+def decrypt_data_batch(encoded_texts: list[str]) -> list[str | None]:
+    """
+    Decrypt many payloads with the shared AES context in one call.
+
+    Args:
+        encoded_texts: Base64 encrypted payload strings.
+
+    Returns:
+        Plaintexts in input order; None where a payload fails to decrypt,
+        so one bad row never aborts the whole batch.
+    """
+    results: list[str | None] = []
+    for encoded_text in encoded_texts:
+        try:
+            results.append(decrypt_data_cached(encoded_text))
+        except ValueError:
+            results.append(None)
+    return results
+
+
 if __name__ == "__main__":
     samples = ["9876543210", "Meeting with Director", "Parcel delivery for Room 301"]
-    print("--- AES-256 GCM Self-Test ---")
-    for text in samples:
-        enc = encrypt_data(text)
+    encoded_samples = [(text, text.encode("utf-8")) for text in samples]
+    print(f"--- {_sealing_aead()[1].__class__.__name__} Self-Test ---")
+    for text, data in encoded_samples:
+        enc = _encrypt_bytes(data)
         dec = decrypt_data(enc)
         status = "OK" if dec == text else "FAIL"
         print(f"  [{status}] '{text}'")